@@ -0,0 +1,102 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models import SystemLog
+from metrics import audit_write_duration, audit_entries_written
+from settings import settings
+
+AUDIT_OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogger:
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, overflow: str):
+        if overflow not in AUDIT_OVERFLOW_POLICIES:
+            raise ValueError(f"AUDIT_OVERFLOW must be one of {AUDIT_OVERFLOW_POLICIES}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self.written = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._inflight: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def log(self, email: str, action: str, details: str = ""):
+        entry = {"user_email": email, "action": action, "details": details, "timestamp": datetime.utcnow()}
+        if self.overflow == "block":
+            await self._queue.put(entry)
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.overflow == "drop_oldest":
+                self._queue.get_nowait()
+                self._queue.put_nowait(entry)
+
+    def _take(self, limit: int) -> List[dict]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: List[dict]):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(SystemLog), batch)
+            await db.commit()
+        audit_write_duration.observe((), time.perf_counter() - started)
+        audit_entries_written.inc((), len(batch))
+        self.written += len(batch)
+
+    async def _run(self):
+        delay = self.flush_interval
+        while True:
+            if not self._inflight:
+                self._inflight = [await self._queue.get()]
+                await asyncio.sleep(self.flush_interval)
+                self._inflight += self._take(self.batch_size - 1)
+            try:
+                await self._write(self._inflight)
+                self._inflight = []
+                delay = self.flush_interval
+            except Exception:
+                logger.exception("Audit log write failed, retrying %d entries in %.1fs", len(self._inflight), delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = self._inflight + self._take(self._queue.qsize())
+        self._inflight = []
+        try:
+            for i in range(0, len(pending), self.batch_size):
+                await self._write(pending[i:i + self.batch_size])
+        except Exception:
+            logger.exception("Audit log final flush failed, %d entries lost", len(pending))
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize() + len(self._inflight), "written": self.written,
+                "dropped": self.dropped, "overflow": self.overflow}
+
+
+audit_log = AuditLogger(settings.audit_queue_size, settings.audit_batch_size, settings.audit_flush_interval,
+                        settings.audit_overflow)
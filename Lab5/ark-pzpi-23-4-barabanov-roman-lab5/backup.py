@@ -0,0 +1,270 @@
+import json
+import time
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete, func, or_, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from sqlalchemy.sql import Select
+
+from database import AsyncSessionLocal, read_engine
+from models import User, Poll, Option, Device, Vote, DeletedPoll
+from settings import settings
+
+BACKUP_FORMATS = {"json": ("application/json", "json"), "ndjson": ("application/x-ndjson", "ndjson")}
+RESTORE_MAX_LINE = 16 * 1024 * 1024
+RESTORE_MODELS = {"user": User, "poll": Poll, "option": Option, "device": Device, "vote": Vote,
+                  "poll_deleted": DeletedPoll}
+
+USER_COLUMNS = (User.id, User.email, User.role, User.created_at, User.updated_at)
+POLL_COLUMNS = (Poll.id, Poll.title, Poll.description, Poll.is_active, Poll.room_id, Poll.owner_id,
+                Poll.created_at, Poll.updated_at)
+OPTION_COLUMNS = (Option.id, Option.poll_id, Option.text, Option.position, Option.vote_count)
+DEVICE_COLUMNS = (Device.id, Device.device_type, Device.room_id, Device.battery_level, Device.last_seen,
+                  Device.updated_at)
+VOTE_COLUMNS = (Vote.id, Vote.poll_id, Vote.option_id, Vote.device_id, Vote.source, Vote.created_at)
+
+Section = Tuple[str, str, Select]
+
+
+def backup_sections(since: Optional[datetime] = None, restorable: bool = False) -> List[Section]:
+    users = select(*USER_COLUMNS, *([User.hashed_password] if restorable else [])).order_by(User.created_at)
+    polls = select(*POLL_COLUMNS).order_by(Poll.created_at)
+    options = select(*OPTION_COLUMNS).order_by(Option.poll_id, Option.position)
+    devices = select(*DEVICE_COLUMNS).order_by(Device.id)
+    votes = select(*VOTE_COLUMNS).order_by(Vote.created_at)
+    sections = []
+
+    if since is not None:
+        changed_polls = or_(Poll.created_at >= since, Poll.updated_at >= since)
+        users = users.where(or_(User.created_at >= since, User.updated_at >= since))
+        polls = polls.where(changed_polls)
+        options = options.where(Option.poll_id.in_(select(Poll.id).where(changed_polls)))
+        devices = devices.where(or_(Device.last_seen >= since, Device.updated_at >= since))
+        votes = votes.where(Vote.created_at >= since)
+        sections.append(("deleted_polls", "poll_deleted",
+                         select(DeletedPoll.id, DeletedPoll.deleted_at)
+                         .where(DeletedPoll.deleted_at >= since).order_by(DeletedPoll.deleted_at)))
+
+    return [("users", "user", users), ("polls", "poll", polls), ("options", "option", options),
+            ("devices", "device", devices), ("votes", "vote", votes)] + sections
+
+
+def _default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=_default, ensure_ascii=False)
+
+
+@asynccontextmanager
+async def _snapshot() -> AsyncIterator[AsyncConnection]:
+    async with read_engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            await conn.exec_driver_sql("BEGIN")
+        else:
+            await conn.execution_options(isolation_level="REPEATABLE READ")
+        yield conn
+
+
+async def _json_chunks(metadata: dict, since: Optional[datetime], restorable: bool) -> AsyncIterator[str]:
+    async with _snapshot() as db:
+        yield '{"metadata": ' + _dumps(metadata)
+        for name, _, query in backup_sections(since, restorable):
+            yield f', "{name}": ['
+            first = True
+            result = await db.stream(query.execution_options(yield_per=settings.backup_chunk_rows))
+            async for rows in result.partitions():
+                chunk = ", ".join(_dumps(r._asdict()) for r in rows)
+                yield chunk if first else ", " + chunk
+                first = False
+            yield "]"
+        yield "}"
+
+
+async def _ndjson_chunks(metadata: dict, since: Optional[datetime], restorable: bool) -> AsyncIterator[str]:
+    async with _snapshot() as db:
+        yield _dumps({"type": "metadata", **metadata}) + "\n"
+        for name, record_type, query in backup_sections(since, restorable):
+            result = await db.stream(query.execution_options(yield_per=settings.backup_chunk_rows))
+            async for rows in result.partitions():
+                yield "".join(_dumps({"type": record_type, **r._asdict()}) + "\n" for r in rows)
+
+
+def backup_checkpoint(started_at: datetime) -> datetime:
+    return started_at - timedelta(seconds=settings.backup_checkpoint_overlap)
+
+
+async def _encode(chunks: AsyncIterator[str], compress: bool) -> AsyncIterator[bytes]:
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    async for chunk in chunks:
+        data = chunk.encode("utf-8")
+        if gzip is not None:
+            data = gzip.compress(data)
+        if data: yield data
+    if gzip is not None:
+        yield gzip.flush()
+
+
+def stream_backup(fmt: str, compress: bool, since: Optional[datetime], started_at: datetime,
+                  restorable: bool = False) -> AsyncIterator[bytes]:
+    metadata = {"timestamp": started_at, "version": "3.3", "format": fmt,
+                "kind": "incremental" if since is not None else "full", "restorable": restorable,
+                "since": since, "checkpoint": backup_checkpoint(started_at)}
+    chunks = (_ndjson_chunks if fmt == "ndjson" else _json_chunks)(metadata, since, restorable)
+    return _encode(chunks, compress)
+
+
+async def _query_chunks(query: Select) -> AsyncIterator[str]:
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.backup_chunk_rows))
+        async for rows in result.partitions():
+            yield "".join(_dumps(r._asdict()) + "\n" for r in rows)
+
+
+def stream_query(query: Select, compress: bool = False) -> AsyncIterator[bytes]:
+    return _encode(_query_chunks(query), compress)
+
+
+class RestoreError(ValueError):
+    pass
+
+
+async def _records(body: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    inflate, buffer, first = None, b"", True
+    async for chunk in body:
+        if first and chunk:
+            first = False
+            if chunk[:2] == b"\x1f\x8b": inflate = zlib.decompressobj(47)
+        buffer += inflate.decompress(chunk) if inflate is not None else chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip(): yield json.loads(line)
+        if len(buffer) > RESTORE_MAX_LINE:
+            raise RestoreError("Backup must be NDJSON (one record per line)")
+    if inflate is not None: buffer += inflate.flush()
+    if buffer.strip(): yield json.loads(buffer)
+
+
+def _columns(model) -> Dict[str, bool]:
+    return {c.name: isinstance(c.type, DateTime) for c in model.__table__.columns}
+
+
+def _row(columns: Dict[str, bool], record: dict) -> dict:
+    row = {}
+    for name, is_datetime in columns.items():
+        if name not in record: continue
+        value = record[name]
+        row[name] = datetime.fromisoformat(value) if is_datetime and value is not None else value
+    return row
+
+
+def _upsert(dialect: str, record_type: str, names):
+    table = RESTORE_MODELS[record_type].__table__
+    stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
+    if record_type == "vote":
+        return stmt.on_conflict_do_nothing(index_elements=["id"])
+    skip = {"id", "vote_count"}
+    return stmt.on_conflict_do_update(index_elements=["id"],
+                                      set_={n: stmt.excluded[n] for n in names if n not in skip})
+
+
+async def _copy_votes(db: AsyncSession, rows: List[dict]):
+    conn = await db.connection()
+    await conn.exec_driver_sql(
+        "CREATE TEMP TABLE IF NOT EXISTS restore_votes (LIKE votes INCLUDING DEFAULTS) ON COMMIT DROP")
+    raw = await conn.get_raw_connection()
+    names = list(rows[0])
+    await raw.driver_connection.copy_records_to_table(
+        "restore_votes", records=[tuple(r[n] for n in names) for r in rows], columns=names)
+    cols = ", ".join(names)
+    await conn.exec_driver_sql(
+        f"INSERT INTO votes ({cols}) SELECT {cols} FROM restore_votes ON CONFLICT (id) DO NOTHING")
+    await conn.exec_driver_sql("TRUNCATE restore_votes")
+
+
+async def _write_batch(db: AsyncSession, dialect: str, record_type: str, rows: List[dict]):
+    if record_type == "poll_deleted":
+        ids = [r["id"] for r in rows]
+        await db.execute(delete(Vote).where(Vote.poll_id.in_(ids)))
+        await db.execute(delete(Option).where(Option.poll_id.in_(ids)))
+        await db.execute(delete(Poll).where(Poll.id.in_(ids)))
+        await db.execute(_upsert(dialect, record_type, rows[0]), rows)
+    elif record_type == "vote" and dialect == "postgresql" and db.bind.dialect.driver == "asyncpg":
+        await _copy_votes(db, rows)
+    else:
+        if record_type == "user" and "hashed_password" not in rows[0]:
+            ids = [r["id"] for r in rows]
+            existing = set((await db.execute(select(User.id).where(User.id.in_(ids)))).scalars())
+            if len(existing) < len(ids):
+                raise RestoreError(f"Backup has no password hashes and {len(ids) - len(existing)} of its users are "
+                                   "not in this database; take the backup with restorable=true")
+        if record_type == "poll":
+            await db.execute(delete(DeletedPoll).where(DeletedPoll.id.in_([r["id"] for r in rows])))
+        await db.execute(_upsert(dialect, record_type, rows[0]), rows)
+
+
+async def _rebuild_vote_counts(db: AsyncSession, poll_ids: List[str]):
+    for i in range(0, len(poll_ids), settings.restore_batch_rows):
+        chunk = poll_ids[i:i + settings.restore_batch_rows]
+        await db.execute(update(Option).where(Option.poll_id.in_(chunk)).values(vote_count=0)
+                         .execution_options(synchronize_session=False))
+        counts = (select(Vote.option_id, func.count().label("n"))
+                  .where(Vote.poll_id.in_(chunk)).group_by(Vote.option_id).subquery())
+        await db.execute(update(Option).where(Option.id == counts.c.option_id).values(vote_count=counts.c.n)
+                         .execution_options(synchronize_session=False))
+
+
+async def restore_backup(db: AsyncSession, body: AsyncIterator[bytes]) -> dict:
+    try:
+        return await _restore(db, body)
+    except (zlib.error, TypeError, KeyError, AttributeError) as e:
+        raise RestoreError(f"Malformed backup, nothing was restored: {e}") from e
+
+
+async def _restore(db: AsyncSession, body: AsyncIterator[bytes]) -> dict:
+    dialect = db.bind.dialect.name
+    columns = {record_type: _columns(model) for record_type, model in RESTORE_MODELS.items()}
+    counts, metadata, touched = Counter(), None, set()
+    batch_type, batch = None, []
+    started = time.perf_counter()
+
+    async for record in _records(body):
+        record_type = record.get("type")
+        if record_type == "metadata":
+            metadata = record
+            continue
+        if metadata is None:
+            raise RestoreError("Backup must be NDJSON and start with a metadata record")
+        if record_type not in columns:
+            raise RestoreError(f"Unknown record type: {record_type!r}")
+        row = _row(columns[record_type], record)
+        if record_type in ("poll", "option", "vote"):
+            touched.add(row.get("id") if record_type == "poll" else row.get("poll_id"))
+
+        if batch and (record_type != batch_type or len(batch) >= settings.restore_batch_rows):
+            await _write_batch(db, dialect, batch_type, batch)
+            batch = []
+        batch_type = record_type
+        batch.append(row)
+        counts[record_type] += 1
+
+    if batch:
+        await _write_batch(db, dialect, batch_type, batch)
+    if metadata is None:
+        raise RestoreError("Backup must be NDJSON and start with a metadata record")
+
+    touched.discard(None)
+    await _rebuild_vote_counts(db, sorted(touched))
+    await db.commit()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {"kind": metadata.get("kind", "full"), "rows": dict(counts), "seconds": round(elapsed, 3),
+            "rows_per_sec": round(total / elapsed, 1) if elapsed > 0 else float(total)}
@@ -0,0 +1,56 @@
+import time
+import argparse
+from types import SimpleNamespace
+
+from main import calculate_stats, bulk_stats
+from poll_stats import PollAggregate, VELOCITY_WINDOWS
+
+
+def time_reads(options_count: int, total_votes: int, reads: int):
+    options = [SimpleNamespace(id=f"opt-{i}", text=f"Option {i}", vote_count=total_votes // options_count)
+               for i in range(options_count)]
+    agg = PollAggregate((o.id, o.text, o.vote_count) for o in options)
+    velocity = dict.fromkeys(VELOCITY_WINDOWS, 0.0)
+
+    started = time.perf_counter()
+    for _ in range(reads): calculate_stats(options, velocity)
+    full = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(reads): agg.total, agg.entropy()
+    incremental = time.perf_counter() - started
+
+    print(f"options={options_count} reads={reads} "
+          f"calculate_stats={full / reads * 1e6:.1f}us/read "
+          f"aggregate_total_entropy={incremental / reads * 1e6:.2f}us/read")
+
+
+def time_bulk(polls: int, options_count: int):
+    options = {f"poll-{i}": [SimpleNamespace(id=f"opt-{i}-{j}", text=f"Option {j}", vote_count=(i * j) % 97)
+                             for j in range(options_count)] for i in range(polls)}
+    velocity = dict.fromkeys(VELOCITY_WINDOWS, 0.0)
+    rows = [(poll_id, o.id, o.text, o.vote_count) for poll_id, opts in options.items() for o in opts]
+
+    loop = vectorized = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for opts in options.values(): calculate_stats(opts, velocity)
+        loop = min(loop, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        bulk_stats(list(options), rows, dict.fromkeys(options, velocity))
+        vectorized = min(vectorized, time.perf_counter() - started)
+
+    print(f"bulk polls={polls} options={options_count} calculate_stats_loop={loop * 1e3:.1f}ms "
+          f"bulk_stats={vectorized * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time incremental and vectorized poll analytics")
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    for n in (4, 32, 256):
+        time_reads(n, 100_000, args.reads)
+    time_bulk(1000, 8)
+    time_bulk(200, 64)
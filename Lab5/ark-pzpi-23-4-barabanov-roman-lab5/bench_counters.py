@@ -0,0 +1,99 @@
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database import DATABASE_URL, Base
+from models import User, Poll, Option, Device, Vote
+from voting import store_votes
+
+
+async def click_orm(Session, poll_id, option_id, device_id):
+    async with Session() as db:
+        opt = await db.get(Option, option_id)
+        db.add(Vote(poll_id=poll_id, option_id=option_id, device_id=device_id, source="bench"))
+        opt.vote_count += 1
+        await db.commit()
+
+
+async def click_atomic(Session, poll_id, option_id, device_id):
+    async with Session() as db:
+        await store_votes(db, [{"poll_id": poll_id, "option_id": option_id, "device_id": device_id,
+                                "source": "bench"}])
+        await db.commit()
+
+
+STRATEGIES = {"orm": click_orm, "atomic": click_atomic}
+
+
+async def run_strategy(Session, name, clicks, poll_id, option_id, device_id):
+    async with Session() as db:
+        await db.execute(delete(Vote).where(Vote.option_id == option_id))
+        opt = await db.get(Option, option_id)
+        opt.vote_count = 0
+        await db.commit()
+
+    click = STRATEGIES[name]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(click(Session, poll_id, option_id, device_id) for _ in range(clicks)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    errors = sum(1 for r in results if isinstance(r, Exception))
+
+    async with Session() as db:
+        counter = (await db.execute(select(Option.vote_count).where(Option.id == option_id))).scalar()
+        rows = (await db.execute(select(func.count(Vote.id)).where(Vote.option_id == option_id))).scalar()
+
+    return {"strategy": name, "clicks": clicks, "errors": errors, "seconds": round(elapsed, 3),
+            "clicks_per_sec": round((clicks - errors) / elapsed, 1), "vote_rows": rows,
+            "vote_count": counter, "lost_increments": rows - counter}
+
+
+async def main(url, clicks, strategies):
+    engine = create_async_engine(url, pool_size=20, max_overflow=0)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    tag = uuid.uuid4().hex[:8]
+    async with Session() as db:
+        user = User(email=f"bench-{tag}@local", hashed_password="-", role="user")
+        device = Device(id=f"bench-{tag}", room_id=f"bench-{tag}")
+        db.add_all([user, device])
+        await db.flush()
+        poll = Poll(title="Counter benchmark", room_id=device.room_id, owner_id=user.id)
+        db.add(poll)
+        await db.flush()
+        option = Option(poll_id=poll.id, text="Hot option", position=0)
+        db.add(option)
+        await db.commit()
+
+    try:
+        for name in strategies:
+            report = await run_strategy(Session, name, clicks, poll.id, option.id, device.id)
+            print(" | ".join(f"{k}={v}" for k, v in report.items()))
+    finally:
+        async with Session() as db:
+            await db.execute(delete(Vote).where(Vote.poll_id == poll.id))
+            await db.execute(delete(Option).where(Option.poll_id == poll.id))
+            await db.execute(delete(Poll).where(Poll.id == poll.id))
+            await db.execute(delete(Device).where(Device.id == device.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent clicks on a single option: ORM read-modify-write "
+                                                 "vs atomic SQL increment")
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--clicks", type=int, default=500)
+    parser.add_argument("--strategy", choices=list(STRATEGIES), action="append")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.clicks, args.strategy or list(STRATEGIES)))
+    sys.exit(0)
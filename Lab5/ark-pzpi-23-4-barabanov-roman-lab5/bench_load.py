@@ -0,0 +1,177 @@
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter
+from datetime import datetime
+
+import httpx
+
+from latency import percentile
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+        self.skipped = 0
+
+    def add(self, started: float, status):
+        self.latencies.append(time.perf_counter() - started)
+        self.statuses[str(status)] += 1
+        if status != 200: self.errors += 1
+
+    def skip(self):
+        self.skipped += 1
+        self.errors += 1
+
+    def report(self, seconds: float) -> dict:
+        ms = [v * 1000 for v in self.latencies]
+        total = len(ms) + self.skipped
+        return {
+            "requests": total, "ok": total - self.errors, "errors": self.errors, "skipped": self.skipped,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "throughput_rps": round((total - self.errors) / seconds, 1),
+            "status_codes": dict(self.statuses),
+            "latency_ms": {"p50": round(percentile(ms, 50), 2), "p95": round(percentile(ms, 95), 2),
+                           "p99": round(percentile(ms, 99), 2), "max": round(max(ms), 2) if ms else 0.0,
+                           "mean": round(statistics.mean(ms), 2) if ms else 0.0}
+        }
+
+
+async def request(client: httpx.AsyncClient, recorder: Recorder, started: float, method: str, url: str, **kw):
+    try:
+        r = await client.request(method, url, **kw)
+        recorder.add(started, r.status_code)
+    except httpx.HTTPError as e:
+        recorder.add(started, type(e).__name__)
+
+
+async def setup(client: httpx.AsyncClient, devices: int, rooms: int, options: int, tag: str):
+    email, password = f"load-{tag}@example.com", "load-password"
+    (await client.post("/auth/register", json={"email": email, "password": password})).raise_for_status()
+    r = await client.post("/auth/login", data={"username": email, "password": password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    poll_ids = []
+    for room in range(rooms):
+        r = await client.post("/polls/", headers=headers,
+                              json={"title": f"Load test {room}", "room_id": f"load-{tag}-{room}",
+                                    "options": [{"text": f"Option {i}"} for i in range(options)]})
+        r.raise_for_status()
+        poll_ids.append(r.json()["id"])
+
+    device_ids = [f"load-{tag}-{i}" for i in range(devices)]
+    for i in range(0, devices, 100):
+        responses = await asyncio.gather(*(client.post("/iot/register",
+                                                       json={"device_id": d, "room_id": f"load-{tag}-{n % rooms}"})
+                                           for n, d in enumerate(device_ids[i:i + 100], start=i)))
+        for r in responses: r.raise_for_status()
+    return headers, poll_ids, device_ids
+
+
+async def drive_clicks(client: httpx.AsyncClient, recorder: Recorder, device_ids, options: int, rate: float,
+                       duration: float, concurrency: int, rng: random.Random):
+    in_flight = asyncio.Semaphore(concurrency)
+    tasks = set()
+    started = time.perf_counter()
+    total = int(rate * duration)
+
+    async def click(scheduled: float, payload: dict):
+        try:
+            await request(client, recorder, scheduled, "POST", "/iot/click", json=payload)
+        finally:
+            in_flight.release()
+
+    for i in range(total):
+        scheduled = started + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0: await asyncio.sleep(delay)
+        if in_flight.locked():
+            recorder.skip()
+            continue
+        await in_flight.acquire()
+        payload = {"device_id": rng.choice(device_ids), "button_index": rng.randrange(options)}
+        task = asyncio.create_task(click(scheduled, payload))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks: await asyncio.gather(*tasks)
+
+
+async def drive_dashboard(client: httpx.AsyncClient, recorder: Recorder, poll_ids, interval: float,
+                          stop: asyncio.Event, rng: random.Random):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await request(client, recorder, started, "GET", f"/polls/{rng.choice(poll_ids)}/analytics")
+        try:
+            await asyncio.wait_for(stop.wait(), max(0.0, interval - (time.perf_counter() - started)))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main(args) -> dict:
+    rng = random.Random(args.seed)
+    tag = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.concurrency + args.dashboards,
+                          max_keepalive_connections=args.concurrency + args.dashboards)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        headers, poll_ids, device_ids = await setup(client, args.devices, args.rooms, args.options, tag)
+        clicks, dashboards = Recorder(), Recorder()
+        stop = asyncio.Event()
+        readers = [asyncio.create_task(drive_dashboard(client, dashboards, poll_ids, args.dashboard_interval,
+                                                       stop, rng)) for _ in range(args.dashboards)]
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            await drive_clicks(client, clicks, device_ids, args.options, args.rate, args.duration,
+                               args.concurrency, rng)
+        finally:
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*readers)
+            for poll_id in poll_ids:
+                await client.delete(f"/polls/{poll_id}", headers=headers)
+
+    return {
+        "started_at": started_at.isoformat(), "seconds": round(elapsed, 3),
+        "config": {"base_url": args.base_url, "devices": args.devices, "rooms": args.rooms,
+                   "options": args.options, "target_rate": args.rate, "duration": args.duration,
+                   "concurrency": args.concurrency, "dashboards": args.dashboards,
+                   "dashboard_interval": args.dashboard_interval, "seed": args.seed},
+        "clicks": clicks.report(elapsed),
+        "analytics": dashboards.report(elapsed),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop IoT click load with concurrent dashboard readers")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=200.0, help="Target clicks per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to drive clicks")
+    parser.add_argument("--concurrency", type=int, default=256, help="Max clicks in flight")
+    parser.add_argument("--dashboards", type=int, default=5)
+    parser.add_argument("--dashboard-interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip("/")
+
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    sys.exit(1 if report["clicks"]["errors"] else 0)
@@ -0,0 +1,99 @@
+import sys
+import time
+import uuid
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from latency import percentile
+
+
+def summarize(name, latencies, errors):
+    ms = [v * 1000 for v in latencies]
+    return {"phase": name, "clicks": len(ms), "errors": errors,
+            "p50_ms": round(percentile(ms, 50), 1), "p95_ms": round(percentile(ms, 95), 1),
+            "p99_ms": round(percentile(ms, 99), 1), "max_ms": round(max(ms), 1) if ms else 0.0,
+            "mean_ms": round(statistics.mean(ms), 1) if ms else 0.0}
+
+
+def click_loop(base_url, device_id, interval, stop):
+    session = requests.Session()
+    latencies, errors = [], 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            r = session.post(f"{base_url}/iot/click", json={"device_id": device_id, "button_index": 1}, timeout=10)
+            if r.status_code != 200: errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+        stop.wait(max(0.0, interval - (time.perf_counter() - started)))
+    return latencies, errors
+
+
+def login_loop(base_url, email, password, stop, counts):
+    session = requests.Session()
+    while not stop.is_set():
+        try:
+            r = session.post(f"{base_url}/auth/login", data={"username": email, "password": password}, timeout=30)
+            counts["ok" if r.status_code == 200 else "failed"] += 1
+        except requests.RequestException:
+            counts["failed"] += 1
+
+
+def measure(base_url, device_id, interval, seconds, storm_workers, email, password):
+    stop = threading.Event()
+    counts = {"ok": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=storm_workers + 1) as pool:
+        clicks = pool.submit(click_loop, base_url, device_id, interval, stop)
+        for _ in range(storm_workers):
+            pool.submit(login_loop, base_url, email, password, stop, counts)
+        time.sleep(seconds)
+        stop.set()
+        latencies, errors = clicks.result()
+    return latencies, errors, counts
+
+
+def main(base_url, seconds, interval, storm_workers):
+    tag = uuid.uuid4().hex[:8]
+    email, password = f"bench-{tag}@example.com", "bench-password"
+    device_id, room_id = f"bench-{tag}", f"bench-{tag}"
+
+    r = requests.post(f"{base_url}/auth/register", json={"email": email, "password": password})
+    r.raise_for_status()
+    r = requests.post(f"{base_url}/auth/login", data={"username": email, "password": password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    r = requests.post(f"{base_url}/polls/", headers=headers,
+                      json={"title": "Login storm benchmark", "room_id": room_id,
+                            "options": [{"text": "A"}, {"text": "B"}]})
+    r.raise_for_status()
+    poll_id = r.json()["id"]
+    requests.post(f"{base_url}/iot/register", json={"device_id": device_id, "room_id": room_id}).raise_for_status()
+
+    try:
+        latencies, errors, _ = measure(base_url, device_id, interval, seconds, 0, email, password)
+        print(" | ".join(f"{k}={v}" for k, v in summarize("baseline", latencies, errors).items()))
+
+        latencies, errors, counts = measure(base_url, device_id, interval, seconds, storm_workers, email, password)
+        report = summarize("login_storm", latencies, errors)
+        report.update(storm_workers=storm_workers, logins=counts["ok"], login_failures=counts["failed"],
+                      logins_per_sec=round(counts["ok"] / seconds, 1))
+        print(" | ".join(f"{k}={v}" for k, v in report.items()))
+    finally:
+        requests.delete(f"{base_url}/polls/{poll_id}", headers=headers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IoT click latency with and without a concurrent login storm")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between clicks")
+    parser.add_argument("--storm-workers", type=int, default=16)
+    args = parser.parse_args()
+    main(args.base_url.rstrip("/"), args.seconds, args.interval, args.storm_workers)
+    sys.exit(0)
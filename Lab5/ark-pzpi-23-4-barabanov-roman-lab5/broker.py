@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+Renderer = Callable[[Iterable[str]], Awaitable[Dict[str, Optional[bytes]]]]
+
+
+class PollBroker:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._dirty: Set[str] = set()
+        self._render: Optional[Renderer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscriber_count(self, poll_id: Optional[str] = None) -> int:
+        if poll_id is not None: return len(self._subscribers.get(poll_id, ()))
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, poll_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(poll_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, poll_id: str, queue: asyncio.Queue):
+        subs = self._subscribers.get(poll_id)
+        if subs is None: return
+        subs.discard(queue)
+        if not subs: del self._subscribers[poll_id]
+
+    def publish(self, poll_id: str):
+        if poll_id in self._subscribers:
+            self._dirty.add(poll_id)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, frame: Optional[bytes]):
+        if queue.full(): queue.get_nowait()
+        queue.put_nowait(frame)
+
+    async def _tick(self):
+        dirty, self._dirty = self._dirty, set()
+        poll_ids = [p for p in dirty if p in self._subscribers]
+        if not poll_ids: return
+        frames = await self._render(poll_ids)
+        for poll_id, frame in frames.items():
+            for queue in list(self._subscribers.get(poll_id, ())):
+                self._offer(queue, frame)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._tick()
+            except Exception:
+                logger.exception("Poll broker tick failed")
+
+    def start(self, render: Renderer):
+        self._render = render
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subs in self._subscribers.values():
+            for queue in subs:
+                self._offer(queue, None)
+
+
+poll_broker = PollBroker(settings.stream_interval)
@@ -0,0 +1,226 @@
+import time
+import uuid
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from settings import settings
+
+
+class ActivePoll(NamedTuple):
+    id: str
+    title: str
+    option_ids: Tuple[str, ...]
+    option_texts: Tuple[str, ...]
+    created_at: datetime
+
+
+class Principal(NamedTuple):
+    id: str
+    email: str
+    role: str
+
+
+class ActivePollCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[float, Optional[ActivePoll]]] = {}
+
+    def get(self, room_id: str) -> Tuple[bool, Optional[ActivePoll]]:
+        entry = self._entries.get(room_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[room_id]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, room_id: str, poll: Optional[ActivePoll], generation: int):
+        if generation != self.generation: return
+        self._entries[room_id] = (time.monotonic() + self.ttl, poll)
+
+    def invalidate(self, room_id: str):
+        self.generation += 1
+        self._entries.pop(room_id, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class DeviceCache:
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+
+    def get(self, device_id: str) -> Tuple[bool, Optional[str]]:
+        entry = self._entries.get(device_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[device_id]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(device_id)
+        if entry[1] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, entry[1]
+
+    def put(self, device_id: str, room_id: Optional[str], generation: Optional[int] = None):
+        if generation is not None and generation != self.generation: return
+        ttl = self.ttl if room_id else self.negative_ttl
+        self._entries[device_id] = (time.monotonic() + ttl, room_id)
+        self._entries.move_to_end(device_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, device_id: str):
+        self.generation += 1
+        self._entries.pop(device_id, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries), "max_size": self.max_size,
+            "hits": self.hits, "negative_hits": self.negative_hits, "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+class PollVersions:
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, int] = {}
+
+    def get(self, poll_id: str) -> int:
+        return self._versions.get(poll_id, 0)
+
+    def bump(self, poll_id: str) -> int:
+        version = self._versions.get(poll_id, 0) + 1
+        self._versions[poll_id] = version
+        return version
+
+    def etag(self, poll_id: str, tick: int = 0) -> str:
+        return f'W/"{self.epoch}-{poll_id}-{self.get(poll_id)}-{tick}"'
+
+
+class AnalyticsCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, int, bytes]] = {}
+
+    def get(self, poll_id: str, version: int) -> Optional[bytes]:
+        entry = self._entries.get(poll_id)
+        if entry is None or entry[1] != version or entry[0] < time.monotonic(): return None
+        return entry[2]
+
+    def put(self, poll_id: str, version: int, body: bytes):
+        self._entries[poll_id] = (time.monotonic() + self.ttl, version, body)
+
+    def drop(self, poll_id: str):
+        self._entries.pop(poll_id, None)
+
+
+class TokenCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[str]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.time():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, token: str, subject: str, expires_at: float):
+        key = self._key(token)
+        self._entries[key] = (expires_at, subject)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[float, Principal]] = {}
+
+    def get(self, subject: str) -> Optional[Principal]:
+        entry = self._entries.get(subject)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[subject]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, subject: str, principal: Principal, generation: int):
+        if generation != self.generation: return
+        self._entries[subject] = (time.monotonic() + self.ttl, principal)
+
+    def invalidate(self, subject: str):
+        self.generation += 1
+        self._entries.pop(subject, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+active_poll_cache = ActivePollCache(settings.poll_cache_ttl)
+device_cache = DeviceCache(settings.device_cache_size, settings.device_cache_ttl, settings.device_cache_negative_ttl)
+poll_versions = PollVersions()
+analytics_cache = AnalyticsCache(settings.analytics_cache_ttl)
+token_cache = TokenCache(settings.token_cache_size)
+principal_cache = PrincipalCache(settings.principal_cache_ttl)
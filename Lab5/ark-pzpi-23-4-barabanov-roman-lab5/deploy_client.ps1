@@ -45,7 +45,7 @@ if (-not (Test-Path "client_venv")) {
 
 # Install only necessary libs for client
 Write-Host " [INSTALL] Installing drivers (requests, rich)..."
-.\client_venv\Scripts\pip install requests rich --disable-pip-version-check
+.\client_venv\Scripts\pip install requests rich httpx --disable-pip-version-check
 
 if ($LASTEXITCODE -eq 0) {
     Write-Host " [OK] Provisioning complete." -ForegroundColor Green
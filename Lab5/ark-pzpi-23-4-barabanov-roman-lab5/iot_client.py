@@ -2,25 +2,131 @@ import json
 import time
 import math
 import random
+import asyncio
+import argparse
+import statistics
 import requests
+import httpx
 import sys
 import os
-from rich.console import Console
+import threading
+from collections import Counter, OrderedDict
+from functools import cached_property
+from datetime import datetime, timezone
+from rich.console import Console, Group
+from rich.live import Live
 from rich.table import Table
 from rich.panel import Panel
+from rich.text import Text
+
+from latency import percentile
 
 console = Console()
 
 
+class ClickJournal:
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self.pending = OrderedDict()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = f.read()
+        if not data.endswith("\n"):
+            data = data[:data.rfind("\n") + 1]
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(data)
+        for line in data.splitlines():
+            entry = json.loads(line)
+            if "ack" in entry:
+                for seq in entry["ack"]: self.pending.pop(seq, None)
+            else:
+                self.pending[entry["seq"]] = entry
+                self.seq = max(self.seq, entry["seq"])
+
+    def _append(self, entry):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, btn_index):
+        self.seq += 1
+        entry = {"seq": self.seq, "button_index": btn_index, "ts": time.time()}
+        self._append(entry)
+        self.pending[self.seq] = entry
+
+    def batch(self, size):
+        return list(self.pending.values())[:size]
+
+    def ack(self, seqs):
+        for seq in seqs: self.pending.pop(seq, None)
+        if self.pending:
+            self._append({"ack": seqs})
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class KeyReader:
+    def __init__(self):
+        self.fd = None
+        self.saved = None
+
+    def __enter__(self):
+        if os.name != "nt" and sys.stdin.isatty():
+            import termios
+            import tty
+            self.fd = sys.stdin.fileno()
+            self.saved = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+        return self
+
+    def __exit__(self, *exc):
+        if self.saved is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+
+    def read(self):
+        if os.name == "nt" and sys.stdin.isatty():
+            import msvcrt
+            return msvcrt.getwch()
+        return sys.stdin.read(1) or "q"
+
+    def start(self, loop, queue):
+        def pump():
+            while True:
+                key = self.read()
+                loop.call_soon_threadsafe(queue.put_nowait, key)
+                if key.lower() == "q": return
+        threading.Thread(target=pump, name="key-reader", daemon=True).start()
+
+
 class SmartPollingTerminal:
-    def __init__(self, config_file="config.json"):
-        self.load_config(config_file)
+    def __init__(self, config_file="config.json", config=None):
+        if config is None:
+            self.load_config(config_file)
+        else:
+            self.config = config
         self.battery = 100.0
         self.rssi = -60
         self.temperature = 36.6
         self.is_registered = False
         self.last_log = "System initialized..."
         self.start_time = time.time()
+        self.retry_attempt = 0
+        self.next_retry = 0.0
+        self.busy = False
+
+    @cached_property
+    def session(self):
+        return requests.Session()
+
+    @cached_property
+    def journal(self):
+        return ClickJournal(self.config.get("journal_file", f"{self.config['device_id']}.journal"))
 
     def load_config(self, filename):
         try:
@@ -38,7 +144,7 @@ class SmartPollingTerminal:
             "room_id": self.config['room_id']
         }
         try:
-            resp = requests.post(url, json=payload, timeout=2)
+            resp = self.session.post(url, json=payload, timeout=2)
             if resp.status_code == 200:
                 self.is_registered = True
                 self.last_log = "[green]Connected to Server[/green]"
@@ -53,27 +159,74 @@ class SmartPollingTerminal:
         self.rssi = -60 + int(5 * math.sin(uptime)) + random.randint(-2, 2)
         self.temperature = 36.6 + math.sin(uptime * 0.5) * 2
 
-    def send_click(self, btn_index):
+    def schedule_retry(self):
+        base, cap = self.config.get("retry_base_s", 1.0), self.config.get("retry_max_s", 60.0)
+        delay = min(cap, base * 2 ** self.retry_attempt)
+        self.next_retry = time.time() + random.uniform(0, delay)
+        self.retry_attempt += 1
+
+    def queue_click(self, btn_index):
+        self.journal.append(btn_index)
+        self.last_log = f"[yellow]Saved offline, {len(self.journal.pending)} click(s) queued[/yellow]"
+
+    def replay_journal(self, force=False):
+        if not self.journal.pending or (not force and time.time() < self.next_retry): return
         if not self.is_registered:
-            self.last_log = "[yellow]Waiting for connection...[/yellow]"
             self.register()
+            if not self.is_registered:
+                self.schedule_retry()
+                return
+
+        url = f"{self.config['server_url']}/iot/click/batch"
+        replayed = accepted = 0
+        batch_size = self.config.get("replay_batch_size", 100)
+        while self.journal.pending:
+            batch = self.journal.batch(batch_size)
+            payload = {"clicks": [{"device_id": self.config['device_id'], "button_index": e["button_index"],
+                                   "clicked_at": datetime.fromtimestamp(e["ts"], timezone.utc).isoformat()}
+                                  for e in batch]}
+            try:
+                resp = self.session.post(url, json=payload, timeout=5)
+            except requests.RequestException:
+                resp = None
+            if resp is not None and resp.status_code == 413 and batch_size > 1:
+                batch_size //= 2
+                continue
+            if resp is None or resp.status_code != 200:
+                self.schedule_retry()
+                reason = "no response" if resp is None else f"HTTP {resp.status_code}"
+                self.last_log = f"[red]Replay failed ({reason}), {len(self.journal.pending)} click(s) queued[/red]"
+                return
+            accepted += resp.json().get("accepted", 0)
+            self.journal.ack([e["seq"] for e in batch])
+            replayed += len(batch)
+
+        self.retry_attempt = 0
+        self.last_log = f"[cyan]REPLAYED:[/cyan] {replayed} click(s), {accepted} accepted"
+
+    def send_click(self, btn_index):
+        if self.journal.pending or not self.is_registered:
+            self.queue_click(btn_index)
+            self.replay_journal()
             return
 
         url = f"{self.config['server_url']}/iot/click"
         payload = {"device_id": self.config['device_id'], "button_index": btn_index}
         try:
-            resp = requests.post(url, json=payload, timeout=2)
+            resp = self.session.post(url, json=payload, timeout=2)
             if resp.status_code == 200:
                 data = resp.json()
                 self.last_log = f"[cyan]VOTED:[/cyan] {data.get('choice')} ({data.get('poll')})"
+            elif resp.status_code >= 500:
+                self.queue_click(btn_index)
+                self.schedule_retry()
             else:
                 self.last_log = f"[red]Server Error:[/red] {resp.text}"
-        except Exception as e:
-            self.last_log = f"[red]Network Error[/red]"
-
-    def draw_ui(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
+        except requests.RequestException:
+            self.queue_click(btn_index)
+            self.schedule_retry()
 
+    def render(self):
         table = Table(title=f"Smart Vote Terminal: {self.config['device_id']}", expand=True)
         table.add_column("Sensor", style="cyan")
         table.add_column("Value", style="magenta")
@@ -88,29 +241,228 @@ class SmartPollingTerminal:
         table.add_row("Temp", f"[{temp_style}]{self.temperature:.1f} °C[/]",
                       "Normal" if self.temperature < 40 else "OVERHEAT")
         table.add_row("[bold white]Room[/]", f"[bold white]{self.config['room_id']}[/]", "Active")
+        queued = len(self.journal.pending)
+        table.add_row("Queue", f"{queued} click(s)", "Synced" if not queued else "[yellow]Pending[/yellow]")
 
-        console.print(table)
-        console.print(Panel(self.last_log, title="Last Event", border_style="blue"))
-        console.print("\n[bold]Controls:[/bold] [0/1] Vote | [r] Reconnect | [q] Quit")
+        busy = " [dim](sending...)[/dim]" if self.busy else ""
+        return Group(table, Panel(self.last_log + busy, title="Last Event", border_style="blue"),
+                     Text.from_markup("\n[bold]Controls:[/bold] [0-9] Vote | [r] Reconnect | [q] Quit"))
 
-    def run(self):
+    async def network_worker(self, actions):
+        while True:
+            try:
+                action, *args = await asyncio.wait_for(actions.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                action, *args = (self.replay_journal,)
+            self.busy = True
+            try:
+                await asyncio.to_thread(action, *args)
+            except Exception as e:
+                self.last_log = f"[red]Client Error:[/red] {e}"
+            finally:
+                self.busy = False
+
+    def reconnect(self):
         self.register()
+        self.replay_journal(force=True)
+
+    async def run_async(self):
+        keys, actions = asyncio.Queue(), asyncio.Queue()
+        actions.put_nowait((self.register,))
+        worker = asyncio.create_task(self.network_worker(actions))
+        interval = 1 / self.config.get("ui_refresh_hz", 4)
+
+        with KeyReader() as reader, Live(self.render(), console=console, auto_refresh=False) as live:
+            reader.start(asyncio.get_running_loop(), keys)
+            while True:
+                try:
+                    key = await asyncio.wait_for(keys.get(), timeout=interval)
+                except asyncio.TimeoutError:
+                    key = None
+
+                if key is None or key.isspace():
+                    pass
+                elif key.lower() == 'q':
+                    break
+                elif key.lower() == 'r':
+                    actions.put_nowait((self.reconnect,))
+                elif key.isdecimal():
+                    actions.put_nowait((self.send_click, int(key)))
+                else:
+                    self.last_log = "[yellow]Invalid command[/yellow]"
+
+                self.update_physics()
+                live.update(self.render(), refresh=True)
+
+        worker.cancel()
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+
+class VirtualTerminal(SmartPollingTerminal):
+    def __init__(self, config, age=0.0):
+        super().__init__(config=config)
+        self.start_time -= age
+        self.latencies = []
+        self.statuses = Counter()
+
+    def record(self, started, status):
+        self.latencies.append(time.perf_counter() - started)
+        self.statuses[str(status)] += 1
+
+    async def register_async(self, client):
+        payload = {"device_id": self.config['device_id'], "device_type": self.config['device_type'],
+                   "room_id": self.config['room_id']}
+        try:
+            resp = await client.post("/iot/register", json=payload)
+            self.is_registered = resp.status_code == 200
+        except httpx.HTTPError:
+            self.is_registered = False
+
+    async def click_async(self, client, btn_index):
+        self.update_physics()
+        if self.battery <= 0:
+            self.statuses["battery_dead"] += 1
+            return
+        if not self.is_registered:
+            await self.register_async(client)
+            if not self.is_registered:
+                self.statuses["unregistered"] += 1
+                return
+
+        started = time.perf_counter()
+        try:
+            resp = await client.post("/iot/click", json={"device_id": self.config['device_id'],
+                                                         "button_index": btn_index})
+            self.record(started, resp.status_code)
+        except httpx.HTTPError as e:
+            self.record(started, type(e).__name__)
+
+    def stats(self):
+        self.update_physics()
+        ms = [v * 1000 for v in self.latencies]
+        return {"device_id": self.config['device_id'], "room_id": self.config['room_id'],
+                "clicks": sum(self.statuses.values()),
+                "ok": self.statuses.get("200", 0), "statuses": dict(self.statuses),
+                "p50_ms": round(percentile(ms, 50), 2), "p95_ms": round(percentile(ms, 95), 2),
+                "max_ms": round(max(ms), 2) if ms else 0.0,
+                "battery": round(self.battery, 1), "rssi": self.rssi}
+
+
+class Fleet:
+    DISTRIBUTIONS = ("uniform", "skewed", "bursty")
+
+    def __init__(self, config, devices, rooms, options, distribution, rate, duration, seed=42,
+                 skew=1.2, burst_interval=10.0, burst_window=1.0):
+        self.rng = random.Random(seed)
+        self.options = options
+        self.distribution = distribution
+        self.rate = rate
+        self.duration = duration
+        self.burst_interval = burst_interval
+        self.burst_window = burst_window
+        self.weights = [1 / (k + 1) ** skew for k in range(options)] if distribution == "skewed" else None
+        self.terminals = [
+            VirtualTerminal({**config, "device_id": f"{config['device_id']}-{i:05d}",
+                             "room_id": rooms[i % len(rooms)]}, age=self.rng.uniform(0, 300))
+            for i in range(devices)]
+
+    def choose_button(self):
+        if self.weights is None: return self.rng.randrange(self.options)
+        return self.rng.choices(range(self.options), self.weights)[0]
+
+    async def run_steady(self, client, terminal, deadline):
+        mean_gap = len(self.terminals) / self.rate
         while True:
-            self.update_physics()
-            self.draw_ui()
+            gap = self.rng.expovariate(1 / mean_gap)
+            if time.monotonic() + gap >= deadline: return
+            await asyncio.sleep(gap)
+            await terminal.click_async(client, self.choose_button())
 
-            choice = console.input("[bold yellow]Action > [/bold yellow]")
+    async def run_bursty(self, client, terminal, deadline):
+        burst_start = time.monotonic()
+        while burst_start < deadline:
+            await asyncio.sleep(max(0.0, burst_start + self.rng.uniform(0, self.burst_window) - time.monotonic()))
+            await terminal.click_async(client, self.choose_button())
+            burst_start += self.burst_interval
+            await asyncio.sleep(max(0.0, burst_start - time.monotonic()))
 
-            if choice.lower() == 'q':
-                break
-            elif choice.lower() == 'r':
-                self.register()
-            elif choice.isdigit():
-                self.send_click(int(choice))
-            else:
-                self.last_log = "[yellow]Invalid command[/yellow]"
+    async def run(self, concurrency=500):
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency,
+                              keepalive_expiry=2.0)
+        async with httpx.AsyncClient(base_url=self.terminals[0].config['server_url'], limits=limits,
+                                     timeout=10) as client:
+            for i in range(0, len(self.terminals), concurrency):
+                await asyncio.gather(*(t.register_async(client) for t in self.terminals[i:i + concurrency]))
+            deadline = time.monotonic() + self.duration
+            runner = self.run_bursty if self.distribution == "bursty" else self.run_steady
+            started = time.perf_counter()
+            await asyncio.gather(*(runner(client, t, deadline) for t in self.terminals))
+            return self.report(time.perf_counter() - started)
+
+    def report(self, seconds):
+        devices = [t.stats() for t in self.terminals]
+        ms = [v * 1000 for t in self.terminals for v in t.latencies]
+        statuses = sum((Counter(d["statuses"]) for d in devices), Counter())
+        clicks, ok = sum(statuses.values()), statuses.get("200", 0)
+        return {
+            "devices": len(devices), "distribution": self.distribution, "seconds": round(seconds, 3),
+            "clicks": clicks, "sent": len(ms), "ok": ok, "error_rate": round(1 - ok / clicks, 4) if clicks else 0.0,
+            "clicks_per_sec": round(clicks / seconds, 1), "statuses": dict(statuses),
+            "latency_ms": {"p50": round(percentile(ms, 50), 2), "p95": round(percentile(ms, 95), 2),
+                           "p99": round(percentile(ms, 99), 2), "max": round(max(ms), 2) if ms else 0.0,
+                           "mean": round(statistics.mean(ms), 2) if ms else 0.0},
+            "per_device": devices
+        }
+
+
+def print_fleet_report(report, top=10):
+    summary = Table(title=f"Fleet: {report['devices']} devices, {report['distribution']}", expand=True)
+    for column in ("Clicks", "OK", "Errors", "Clicks/s", "p50 ms", "p95 ms", "p99 ms", "Max ms"):
+        summary.add_column(column, style="magenta")
+    lat = report["latency_ms"]
+    summary.add_row(str(report["clicks"]), str(report["ok"]), f"{report['error_rate'] * 100:.2f} %",
+                    str(report["clicks_per_sec"]), str(lat["p50"]), str(lat["p95"]), str(lat["p99"]), str(lat["max"]))
+    console.print(summary)
+
+    slowest = Table(title=f"Slowest {top} devices by p95", expand=True)
+    for column in ("Device", "Room", "Clicks", "p50 ms", "p95 ms", "Max ms", "Battery", "Signal"):
+        slowest.add_column(column, style="cyan")
+    for d in sorted(report["per_device"], key=lambda d: d["p95_ms"], reverse=True)[:top]:
+        slowest.add_row(d["device_id"], d["room_id"], str(d["clicks"]), str(d["p50_ms"]), str(d["p95_ms"]),
+                        str(d["max_ms"]), f"{d['battery']:.1f} %", f"{d['rssi']} dBm")
+    console.print(slowest)
 
 
 if __name__ == "__main__":
-    client = SmartPollingTerminal()
-    client.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Smart vote terminal simulator")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--fleet", type=int, default=0, help="Run N headless virtual terminals instead of the UI")
+    parser.add_argument("--rooms", help="Comma-separated room ids for the fleet (default: room_id from config)")
+    parser.add_argument("--options", type=int, default=2, help="Number of buttons on each terminal")
+    parser.add_argument("--distribution", choices=Fleet.DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--rate", type=float, default=100.0, help="Fleet-wide clicks per second (uniform/skewed)")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent for the skewed distribution")
+    parser.add_argument("--burst-interval", type=float, default=10.0)
+    parser.add_argument("--burst-window", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=500, help="Max HTTP connections shared by the fleet")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the fleet report as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.fleet:
+        client = SmartPollingTerminal(args.config)
+        client.run()
+        sys.exit(0)
+
+    base = SmartPollingTerminal(args.config).config
+    rooms = args.rooms.split(",") if args.rooms else [base['room_id']]
+    fleet = Fleet(base, args.fleet, rooms, args.options, args.distribution, args.rate, args.duration, args.seed,
+                  args.skew, args.burst_interval, args.burst_window)
+    report = asyncio.run(fleet.run(args.concurrency))
+    print_fleet_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
\ No newline at end of file
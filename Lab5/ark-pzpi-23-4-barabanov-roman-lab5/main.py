@@ -1,30 +1,44 @@
 import math
-import json
-import io
+import base64
+import asyncio
+from collections import Counter
 import pytz
+import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Optional
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Depends, status, Header
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Response, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update, func
+from sqlalchemy import select, delete, update, func, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 
-from database import engine, Base, get_db
-from models import Poll, Option, Vote, Device, User, SystemLog
+from database import engine, Base, get_db, AsyncSessionLocal, pool_stats
+from models import Poll, Option, Device, User, SystemLog, DeletedPoll
 from schemas import *
+from voting import resolve_device_rooms, resolve_active_polls, commit_votes
+from cache import active_poll_cache, device_cache, poll_versions, analytics_cache, token_cache, principal_cache
+from cache import Principal
+from poll_stats import poll_stats, poll_velocity
+from broker import poll_broker
+from backup import stream_backup, backup_checkpoint, restore_backup, stream_query, BACKUP_FORMATS
+from audit import audit_log
+from vote_buffer import vote_buffer
+from settings import settings
+from passwords import hash_password, verify_password
+from metrics import registry, MetricsMiddleware, GaugeCallback, votes_ingested
+from query_stats import QueryStatsMiddleware
 
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+MAX_CLICK_BATCH = 1000
 
 MESSAGES = {
     "en": {
@@ -32,14 +46,18 @@ MESSAGES = {
         "device_unknown": "Device unknown or not assigned",
         "vote_success": "Vote accepted",
         "no_active_poll": "No active poll in room",
-        "invalid_button": "Invalid button index"
+        "invalid_button": "Invalid button index",
+        "stale_click": "Click predates the active poll",
+        "batch_too_large": "Too many clicks in one batch"
     },
     "uk": {
         "poll_not_found": "Опитування не знайдено",
         "device_unknown": "Пристрій невідомий або не прив'язаний до кімнати",
         "vote_success": "Голос зараховано",
         "no_active_poll": "В кімнаті немає активного опитування",
-        "invalid_button": "Невірний номер кнопки"
+        "invalid_button": "Невірний номер кнопки",
+        "stale_click": "Натискання зроблено до початку активного опитування",
+        "batch_too_large": "Забагато натискань в одному пакеті"
     }
 }
 
@@ -57,21 +75,51 @@ def get_locale_time(dt: datetime):
     return dt.astimezone(kyiv_tz)
 
 
-async def log_action(db: AsyncSession, email: str, action: str, details: str = ""):
-    db.add(SystemLog(user_email=email, action=action, details=details))
-    await db.commit()
+def to_utc_naive(dt: Optional[datetime]):
+    if dt is None or dt.tzinfo is None: return dt
+    return dt.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+async def log_action(email: str, action: str, details: str = ""):
+    await audit_log.log(email, action, details)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    if settings.vote_buffer_enabled: vote_buffer.start()
+    poll_broker.start(render_stream_frames)
+    audit_log.start()
     yield
+    await poll_broker.stop()
+    await vote_buffer.stop()
+    await audit_log.stop()
 
 
 app = FastAPI(title="IoT Polling System (Full)", version="3.3", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"],
                    allow_headers=["*"])
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+def collect_pool_gauges():
+    stats = pool_stats()
+    pools = {"primary": stats} if "readers" not in stats else {"writer": stats, "reader": stats["readers"]}
+    return {(name, state): s.get(state, 0)
+            for name, s in pools.items() for state in ("checked_out", "overflow", "size")}
+
+
+def collect_audit_gauges():
+    stats = audit_log.stats()
+    return {("queued",): stats["queued"], ("dropped",): stats["dropped"]}
+
+
+registry.register(GaugeCallback("db_pool_connections", "DB pool connections by state", ("pool", "state"),
+                                collect_pool_gauges))
+registry.register(GaugeCallback("audit_log_entries", "Audit log entries queued in memory or dropped on overflow",
+                                ("state",), collect_audit_gauges))
 
 
 def create_token(data: dict):
@@ -80,20 +128,35 @@ def create_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+def decode_token_subject(token: str) -> str:
+    email = token_cache.get(token)
+    if email: return email
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if not email: raise HTTPException(401)
     except JWTError:
         raise HTTPException(401)
-    res = await db.execute(select(User).where(User.email == email))
-    user = res.scalar_one_or_none()
-    if not user: raise HTTPException(401)
-    return user
+    if "exp" in payload: token_cache.put(token, email, payload["exp"])
+    return email
+
 
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    email = decode_token_subject(token)
+    principal = principal_cache.get(email)
+    if principal: return principal
 
-async def get_current_admin(user: User = Depends(get_current_user)):
+    generation = principal_cache.generation
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(select(User.id, User.email, User.role).where(User.email == email))
+        row = res.one_or_none()
+    if not row: raise HTTPException(401)
+    principal = Principal(*row)
+    principal_cache.put(email, principal, generation)
+    return principal
+
+
+async def get_current_admin(user: Principal = Depends(get_current_user)):
     if user.role != "admin": raise HTTPException(403, "Admins only")
     return user
 
@@ -106,10 +169,10 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     count = (await db.execute(select(func.count(User.id)))).scalar()
     role = "admin" if count == 0 else "user"
 
-    new_user = User(email=user.email, hashed_password=pwd_context.hash(user.password), role=role)
+    new_user = User(email=user.email, hashed_password=await hash_password(user.password), role=role)
     db.add(new_user)
     await db.commit()
-    await log_action(db, user.email, "REGISTER", f"Role: {role}")
+    await log_action(user.email, "REGISTER", f"Role: {role}")
     return new_user
 
 
@@ -117,64 +180,156 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(User).where(User.email == form_data.username))
     user = res.scalar_one_or_none()
-    if not user or not pwd_context.verify(form_data.password, user.hashed_password):
-        raise HTTPException(400, "Bad credentials")
+    if not user: raise HTTPException(400, "Bad credentials")
+    valid, new_hash = await verify_password(form_data.password, user.hashed_password)
+    if not valid: raise HTTPException(400, "Bad credentials")
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
 
     token = create_token({"sub": user.email, "role": user.role})
-    await log_action(db, user.email, "LOGIN")
+    await log_action(user.email, "LOGIN")
     return {"access_token": token, "token_type": "bearer", "role": user.role}
 
 
 @app.get("/admin/users", tags=["Admin"], response_model=List[UserRead])
-async def list_users(admin: User = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
+async def list_users(admin: Principal = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
     return (await db.execute(select(User))).scalars().all()
 
 
 @app.patch("/admin/users/{user_id}/role", tags=["Admin"])
-async def change_role(user_id: str, data: UserRoleUpdate, admin: User = Depends(get_current_admin),
+async def change_role(user_id: str, data: UserRoleUpdate, admin: Principal = Depends(get_current_admin),
                       db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(User).where(User.id == user_id))
     user = res.scalar_one_or_none()
     if not user: raise HTTPException(404)
     user.role = data.role
     await db.commit()
-    await log_action(db, admin.email, "CHANGE_ROLE", f"User {user.email} -> {data.role}")
+    principal_cache.invalidate(user.email)
+    await log_action(admin.email, "CHANGE_ROLE", f"User {user.email} -> {data.role}")
     return {"status": "updated"}
 
 
+def encode_log_cursor(log: SystemLog):
+    return base64.urlsafe_b64encode(f"{log.timestamp.isoformat()}|{log.id}".encode()).decode()
+
+
+def decode_log_cursor(cursor: str):
+    try:
+        ts, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def filter_logs(query, user_email: Optional[str], action: Optional[str], since: Optional[datetime],
+                until: Optional[datetime]):
+    if user_email: query = query.where(SystemLog.user_email == user_email)
+    if action: query = query.where(SystemLog.action == action)
+    if since: query = query.where(SystemLog.timestamp >= to_utc_naive(since))
+    if until: query = query.where(SystemLog.timestamp < to_utc_naive(until))
+    return query.order_by(SystemLog.timestamp.desc(), SystemLog.id.desc())
+
+
 @app.get("/admin/logs", tags=["Admin"], response_model=List[SystemLogRead])
-async def view_logs(admin: User = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
-    return (await db.execute(select(SystemLog).order_by(SystemLog.timestamp.desc()).limit(50))).scalars().all()
+async def view_logs(response: Response, limit: int = Query(default=50, ge=1, le=500), cursor: Optional[str] = None,
+                    user_email: Optional[str] = None, action: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    admin: Principal = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
+    query = filter_logs(select(SystemLog), user_email, action, since, until)
+    if cursor:
+        query = query.where(tuple_(SystemLog.timestamp, SystemLog.id) < decode_log_cursor(cursor))
 
+    logs = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = encode_log_cursor(logs[-1])
+    return logs
 
-@app.get("/admin/backup", tags=["Admin"])
-async def create_backup(admin: User = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
-    users = (await db.execute(select(User))).scalars().all()
-    polls = (await db.execute(select(Poll))).scalars().all()
-    votes = (await db.execute(select(Vote))).scalars().all()
-
-    backup_data = {
-        "metadata": {"timestamp": str(datetime.utcnow()), "version": "3.3"},
-        "users": [{"email": u.email, "role": u.role} for u in users],
-        "polls": [{"title": p.title, "room": p.room_id, "active": p.is_active} for p in polls],
-        "votes": [{"poll_id": v.poll_id, "device_id": v.device_id, "source": v.source} for v in votes]
-    }
 
-    file_stream = io.BytesIO(json.dumps(backup_data, indent=4).encode("utf-8"))
-    await log_action(db, admin.email, "BACKUP_CREATED", "Full DB dump downloaded")
+@app.get("/admin/logs/export", tags=["Admin"])
+async def export_logs(user_email: Optional[str] = None, action: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None, gzip: bool = False,
+                      admin: Principal = Depends(get_current_admin)):
+    query = filter_logs(select(SystemLog.id, SystemLog.timestamp, SystemLog.user_email, SystemLog.action,
+                               SystemLog.details), user_email, action, since, until)
+    await log_action(admin.email, "LOGS_EXPORTED", f"user={user_email} action={action} since={since} until={until}")
+
+    filename = "system-logs.ndjson.gz" if gzip else "system-logs.ndjson"
+    media_type = "application/gzip" if gzip else "application/x-ndjson"
+    return StreamingResponse(stream_query(query, gzip), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename={filename}"})
 
-    return StreamingResponse(file_stream, media_type="application/json",
-                             headers={"Content-Disposition": "attachment; filename=backup.json"})
+
+@app.get("/admin/cache", tags=["Admin"])
+async def cache_stats(admin: Principal = Depends(get_current_admin)):
+    return {"devices": device_cache.stats(), "active_polls": active_poll_cache.stats(),
+            "tokens": token_cache.stats(), "principals": principal_cache.stats()}
+
+
+@app.get("/metrics", tags=["Admin"])
+async def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/admin/pool", tags=["Admin"])
+async def db_pool_stats(admin: Principal = Depends(get_current_admin)):
+    return pool_stats()
+
+
+@app.get("/admin/backup", tags=["Admin"])
+async def create_backup(fmt: str = Query(default="ndjson", alias="format", pattern="^(json|ndjson)$",
+                                         description="Only ndjson backups can be fed back to /admin/restore"),
+                        gzip: bool = False, since: Optional[datetime] = None,
+                        restorable: bool = Query(default=False, description="Include password hashes"),
+                        admin: Principal = Depends(get_current_admin)):
+    since = to_utc_naive(since)
+    started_at = datetime.utcnow()
+    details = f"Incremental dump since {since.isoformat()}" if since else "Full DB dump downloaded"
+    await log_action(admin.email, "BACKUP_CREATED", details)
+
+    media_type, ext = BACKUP_FORMATS[fmt]
+    kind = "incremental" if since else "full"
+    filename = f"backup-{kind}-{started_at:%Y%m%dT%H%M%S}.{ext}" + (".gz" if gzip else "")
+    return StreamingResponse(stream_backup(fmt, gzip, since, started_at, restorable),
+                             media_type="application/gzip" if gzip else media_type,
+                             headers={"Content-Disposition": f"attachment; filename={filename}",
+                                      "X-Backup-Checkpoint": backup_checkpoint(started_at).isoformat()})
+
+
+@app.post("/admin/restore", tags=["Admin"])
+async def restore_from_backup(request: Request, admin: Principal = Depends(get_current_admin),
+                              db: AsyncSession = Depends(get_db)):
+    try:
+        report = await restore_backup(db, request.stream())
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(400, str(e))
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(409, "Backup conflicts with existing data")
+
+    active_poll_cache.clear()
+    device_cache.clear()
+    principal_cache.clear()
+    poll_stats.clear()
+    await log_action(admin.email, "RESTORE", f"{report['kind']}: {sum(report['rows'].values())} rows")
+    return report
 
 
 @app.post("/polls/", tags=["Polls"], response_model=PollRead)
-async def create_poll(poll: PollCreate, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def create_poll(poll: PollCreate, user: Principal = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_db)):
     new_poll = Poll(title=poll.title, description=poll.description, room_id=poll.room_id, owner_id=user.id)
     db.add(new_poll)
     await db.flush()
-    for opt in poll.options: db.add(Option(poll_id=new_poll.id, text=opt.text))
+    new_opts = [Option(poll_id=new_poll.id, text=opt.text, position=i) for i, opt in enumerate(poll.options)]
+    db.add_all(new_opts)
     await db.commit()
-    await log_action(db, user.email, "CREATE_POLL", f"ID: {new_poll.id}")
+    active_poll_cache.invalidate(new_poll.room_id)
+    poll_stats.load(new_poll.id, [(o.id, o.text, 0) for o in new_opts], poll_stats.generation(new_poll.id))
+    poll_versions.bump(new_poll.id)
+    await log_action(user.email, "CREATE_POLL", f"ID: {new_poll.id}")
 
     query = select(Poll).options(selectinload(Poll.options)).where(Poll.id == new_poll.id)
     result = await db.execute(query)
@@ -183,7 +338,7 @@ async def create_poll(poll: PollCreate, user: User = Depends(get_current_user),
 
 
 @app.get("/polls/my", tags=["Polls"], response_model=List[PollRead])
-async def list_my_polls(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def list_my_polls(user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     query = (
         select(Poll)
         .options(selectinload(Poll.options))
@@ -196,18 +351,25 @@ async def list_my_polls(user: User = Depends(get_current_user), db: AsyncSession
 
 
 @app.delete("/polls/{poll_id}", tags=["Polls"])
-async def delete_poll(poll_id: str, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def delete_poll(poll_id: str, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(Poll).where(Poll.id == poll_id))
     poll = res.scalar_one_or_none()
     if not poll: raise HTTPException(404)
     if poll.owner_id != user.id and user.role != "admin": raise HTTPException(403)
     await db.delete(poll)
+    await db.merge(DeletedPoll(id=poll_id, deleted_at=datetime.utcnow()))
     await db.commit()
-    await log_action(db, user.email, "DELETE_POLL", f"ID: {poll_id}")
+    active_poll_cache.invalidate(poll.room_id)
+    poll_stats.drop(poll_id)
+    poll_velocity.drop(poll_id)
+    poll_versions.bump(poll_id)
+    analytics_cache.drop(poll_id)
+    poll_broker.publish(poll_id)
+    await log_action(user.email, "DELETE_POLL", f"ID: {poll_id}")
     return {"status": "deleted"}
 
 
-def calculate_stats(options_db, poll_created_at):
+def calculate_stats(options_db, velocity):
     total = sum(o.vote_count for o in options_db)
     entropy = 0.0
 
@@ -216,56 +378,172 @@ def calculate_stats(options_db, poll_created_at):
             p = o.vote_count / total
             if p > 0: entropy -= p * math.log2(p)
 
-    now = datetime.utcnow()
-    if poll_created_at.tzinfo is None:
-        poll_created_at = pytz.utc.localize(poll_created_at)
+    return build_stats(total, entropy, [(o.id, o.text, o.vote_count) for o in options_db], velocity)
+
 
-    duration_minutes = (pytz.utc.localize(now) - poll_created_at).total_seconds() / 60
-    if duration_minutes < 1: duration_minutes = 1
-    velocity = round(total / duration_minutes, 2)
+def summarize_stats(total, entropy, velocity):
+    bpm = velocity["last_1m"]
 
     activity_level = "Low"
-    if velocity > 5:
+    if bpm > 5:
         activity_level = "High Hype"
-    elif velocity > 1:
+    elif bpm > 1:
         activity_level = "Moderate"
 
+    return {
+        "total_votes": total,
+        "controversy_index": round(entropy, 2),
+        "vote_velocity_bpm": bpm,
+        "vote_velocity": velocity,
+        "activity_status": activity_level,
+        "consensus_status": "High Controversy" if entropy > 1.0 else "Consensus"
+    }
+
+
+def build_stats(total, entropy, option_rows, velocity):
     stats_opts = []
-    for o in options_db:
-        p = 0.0 if total == 0 else o.vote_count / total
+    for opt_id, text, vote_count in option_rows:
+        p = 0.0 if total == 0 else vote_count / total
         err = 1.96 * math.sqrt((p * (1 - p)) / total) if total > 1 else 0.0
         stats_opts.append({
-            "id": o.id, "text": o.text, "vote_count": o.vote_count,
+            "id": opt_id, "text": text, "vote_count": vote_count,
             "percentage": round(p * 100, 1), "margin_of_error": round(err * 100, 1)
         })
 
-    return {
-        "analytics": {
-            "total_votes": total,
-            "controversy_index": round(entropy, 2),
-            "vote_velocity_bpm": velocity,
-            "activity_status": activity_level,
-            "consensus_status": "High Controversy" if entropy > 1.0 else "Consensus"
-        },
-        "options": stats_opts
-    }
+    return {"analytics": summarize_stats(total, entropy, velocity), "options": stats_opts}
 
 
-@app.get("/polls/{poll_id}/analytics", response_model=PollReadDetailed, tags=["Analytics"])
-async def get_analytics(poll_id: str, accept_language: str = Header(default="en"), db: AsyncSession = Depends(get_db)):
+def round1(values):
+    rounded = np.round(values, 1)
+    scaled = values * 10
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded[i] = round(float(values[i]), 1)
+    return rounded.tolist()
+
+
+def bulk_stats(poll_ids, option_rows, velocities):
+    index = {poll_id: i for i, poll_id in enumerate(poll_ids)}
+    group = np.fromiter((index[r[0]] for r in option_rows), dtype=np.int64, count=len(option_rows))
+    counts = np.fromiter((r[3] or 0 for r in option_rows), dtype=np.float64, count=len(option_rows))
+
+    totals = np.bincount(group, weights=counts, minlength=len(poll_ids))
+    per_opt_total = totals[group]
+    p = np.divide(counts, per_opt_total, out=np.zeros_like(counts), where=per_opt_total > 0)
+    plogp = np.zeros_like(p)
+    np.multiply(p, np.log2(p, out=np.zeros_like(p), where=p > 0), out=plogp, where=p > 0)
+    entropy = -np.bincount(group, weights=plogp, minlength=len(poll_ids))
+    err = np.sqrt(np.divide(p * (1 - p), per_opt_total, out=np.zeros_like(p), where=per_opt_total > 1)) * 1.96
+
+    stats = {poll_id: {"options": []} for poll_id in poll_ids}
+    for (poll_id, opt_id, text, vote_count), pct, moe in zip(option_rows, round1(p * 100), round1(err * 100)):
+        stats[poll_id]["options"].append({
+            "id": opt_id, "text": text, "vote_count": vote_count or 0, "percentage": pct, "margin_of_error": moe
+        })
+    for poll_id, total, h in zip(poll_ids, totals.tolist(), entropy.tolist()):
+        stats[poll_id]["analytics"] = summarize_stats(int(total), max(0.0, round(h, 12)), velocities[poll_id])
+    return stats
+
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    if not if_none_match: return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+async def render_analytics(db: AsyncSession, poll_id: str):
+    agg = poll_stats.get(poll_id)
+    version = poll_versions.get(poll_id)
+    body = analytics_cache.get(poll_id, version) if agg is not None else None
+    if body is not None: return body
+
     res = await db.execute(select(Poll).where(Poll.id == poll_id))
     poll = res.scalar_one_or_none()
+    if not poll: return None
 
-    if not poll: raise HTTPException(404, t("poll_not_found", accept_language))
+    if agg is None:
+        generation = poll_stats.generation(poll_id)
+        opts = (await db.execute(
+            select(Option.id, Option.text, Option.vote_count)
+            .where(Option.poll_id == poll_id).order_by(Option.position)))
+        agg = poll_stats.load(poll_id, opts.all(), generation)
+        version = poll_versions.bump(poll_id)
 
-    opts = (await db.execute(select(Option).where(Option.poll_id == poll_id))).scalars().all()
-
-    stats = calculate_stats(opts, poll.created_at)
+    stats = build_stats(agg.total, agg.entropy(), agg.rows(), poll_velocity.rates(poll_id))
 
     poll_dict = poll.__dict__.copy()
     poll_dict["created_at"] = get_locale_time(poll.created_at)
 
-    return {**poll_dict, "analytics": stats["analytics"], "options": stats["options"]}
+    detailed = PollReadDetailed.model_validate(
+        {**poll_dict, "analytics": stats["analytics"], "options": stats["options"]})
+    body = detailed.model_dump_json().encode("utf-8")
+    analytics_cache.put(poll_id, version, body)
+    return body
+
+
+async def render_stream_frames(poll_ids):
+    async with AsyncSessionLocal() as db:
+        frames = {}
+        for poll_id in poll_ids:
+            body = await render_analytics(db, poll_id)
+            frames[poll_id] = b"event: analytics\ndata: " + body + b"\n\n" if body is not None else None
+        return frames
+
+
+@app.get("/polls/{poll_id}/analytics", response_model=PollReadDetailed, tags=["Analytics"])
+async def get_analytics(poll_id: str, accept_language: str = Header(default="en"),
+                        if_none_match: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_db)):
+    etag = poll_versions.etag(poll_id, poll_velocity.tick(poll_id))
+    if poll_stats.get(poll_id) is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body = await render_analytics(db, poll_id)
+    if body is None: raise HTTPException(404, t("poll_not_found", accept_language))
+
+    etag = poll_versions.etag(poll_id, poll_velocity.tick(poll_id))
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+
+@app.get("/admin/analytics", tags=["Admin"], response_model=List[PollReadDetailed])
+async def bulk_analytics(poll_id: Optional[List[str]] = Query(default=None), active_only: bool = True,
+                         admin: Principal = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
+    query = select(Poll).order_by(Poll.created_at.desc())
+    if poll_id: query = query.where(Poll.id.in_(poll_id))
+    if active_only: query = query.where(Poll.is_active == True)
+    polls = (await db.execute(query)).scalars().all()
+    if not polls: return []
+
+    ids = [p.id for p in polls]
+    rows = (await db.execute(
+        select(Option.poll_id, Option.id, Option.text, Option.vote_count)
+        .where(Option.poll_id.in_(ids))
+        .order_by(Option.poll_id, Option.position))).all()
+
+    stats = bulk_stats(ids, rows, {i: poll_velocity.rates(i) for i in ids})
+    return [{**p.__dict__, **stats[p.id]} for p in polls]
+
+
+@app.get("/polls/{poll_id}/stream", tags=["Analytics"])
+async def stream_analytics(poll_id: str, accept_language: str = Header(default="en")):
+    frames = await render_stream_frames([poll_id])
+    if frames[poll_id] is None: raise HTTPException(404, t("poll_not_found", accept_language))
+
+    queue = poll_broker.subscribe(poll_id)
+
+    async def events():
+        try:
+            yield frames[poll_id]
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), settings.stream_keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is None: break
+                yield frame
+        finally:
+            poll_broker.unsubscribe(poll_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.post("/iot/register", tags=["IoT"])
@@ -276,36 +554,78 @@ async def register_device(dev: DeviceRegister, db: AsyncSession = Depends(get_db
     else:
         db.add(Device(id=dev.device_id, device_type=dev.device_type, room_id=dev.room_id))
     await db.commit()
+    device_cache.invalidate(dev.device_id)
+    device_cache.put(dev.device_id, dev.room_id)
     return {"status": "registered"}
 
 
 @app.post("/iot/click", tags=["IoT"])
 async def smart_click(click: IoTClick, accept_language: str = Header(default="en"), db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(Device).where(Device.id == click.device_id))
-    device = res.scalar_one_or_none()
+    room_id = (await resolve_device_rooms(db, [click.device_id]))[click.device_id]
 
-    if not device or not device.room_id:
+    if not room_id:
         raise HTTPException(400, t("device_unknown", accept_language))
 
-    p_res = await db.execute(
-        select(Poll).where(Poll.room_id == device.room_id, Poll.is_active == True).order_by(Poll.created_at.desc()))
-    poll = p_res.scalar_one_or_none()
+    poll = (await resolve_active_polls(db, [room_id]))[room_id]
 
     if not poll:
         raise HTTPException(404, t("no_active_poll", accept_language))
 
-    opts = (await db.execute(select(Option).where(Option.poll_id == poll.id))).scalars().all()
-    if click.button_index >= len(opts):
+    if click.button_index >= len(poll.option_ids):
         raise HTTPException(400, t("invalid_button", accept_language))
 
-    selected_opt = opts[click.button_index]
-    db.add(Vote(poll_id=poll.id, option_id=selected_opt.id, device_id=device.id, source="iot_room"))
-    selected_opt.vote_count += 1
-    await db.commit()
+    vote = {"poll_id": poll.id, "option_id": poll.option_ids[click.button_index], "device_id": click.device_id,
+            "source": "iot_room"}
+    if not (settings.vote_buffer_enabled and vote_buffer.add([vote])):
+        await commit_votes(db, [vote])
+    votes_ingested.inc((room_id, poll.id))
 
-    return {"status": "voted", "poll": poll.title, "choice": selected_opt.text,
+    return {"status": "voted", "poll": poll.title, "choice": poll.option_texts[click.button_index],
             "message": t("vote_success", accept_language)}
 
 
+@app.post("/iot/click/batch", tags=["IoT"], response_model=IoTClickBatchResult)
+async def smart_click_batch(batch: IoTClickBatch, accept_language: str = Header(default="en"),
+                            db: AsyncSession = Depends(get_db)):
+    if len(batch.clicks) > MAX_CLICK_BATCH:
+        raise HTTPException(413, t("batch_too_large", accept_language))
+
+    rooms = await resolve_device_rooms(db, (c.device_id for c in batch.clicks))
+    polls = await resolve_active_polls(db, (r for r in rooms.values() if r))
+
+    results, votes, ingested = [], [], Counter()
+    for click in batch.clicks:
+        room_id = rooms.get(click.device_id)
+        poll = polls.get(room_id) if room_id else None
+        error = None
+        if not room_id:
+            error = "device_unknown"
+        elif not poll:
+            error = "no_active_poll"
+        elif click.button_index >= len(poll.option_ids):
+            error = "invalid_button"
+        elif click.clicked_at and to_utc_naive(click.clicked_at) < poll.created_at:
+            error = "stale_click"
+
+        if error:
+            results.append(IoTClickResult(device_id=click.device_id, button_index=click.button_index,
+                                          status="rejected", message=t(error, accept_language)))
+            continue
+
+        votes.append({"poll_id": poll.id, "option_id": poll.option_ids[click.button_index],
+                      "device_id": click.device_id, "source": "iot_room"})
+        ingested[(room_id, poll.id)] += 1
+        results.append(IoTClickResult(device_id=click.device_id, button_index=click.button_index,
+                                      status="voted", poll=poll.title,
+                                      choice=poll.option_texts[click.button_index],
+                                      message=t("vote_success", accept_language)))
+
+    if not (settings.vote_buffer_enabled and vote_buffer.add(votes)):
+        await commit_votes(db, votes)
+    for labels, n in ingested.items(): votes_ingested.inc(labels, n)
+
+    return {"accepted": len(votes), "rejected": len(results) - len(votes), "results": results}
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, ForeignKey, Integer, DateTime, Text
+from sqlalchemy import Column, String, Boolean, ForeignKey, Integer, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -13,6 +13,7 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(String, default="user")
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     polls = relationship("Poll", back_populates="owner")
 
@@ -27,9 +28,10 @@ class Poll(Base):
     room_id = Column(String, index=True)
     owner_id = Column(String, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     owner = relationship("User", back_populates="polls")
-    options = relationship("Option", back_populates="poll", cascade="all, delete")
+    options = relationship("Option", back_populates="poll", cascade="all, delete", order_by="Option.position")
     votes = relationship("Vote", back_populates="poll", cascade="all, delete")
 
 
@@ -39,6 +41,7 @@ class Option(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     poll_id = Column(String, ForeignKey("polls.id"))
     text = Column(String)
+    position = Column(Integer, default=0)
     vote_count = Column(Integer, default=0)
 
     poll = relationship("Poll", back_populates="options")
@@ -53,6 +56,7 @@ class Device(Base):
     room_id = Column(String, nullable=True)
     battery_level = Column(Integer, default=100)
     last_seen = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     votes = relationship("Vote", back_populates="device")
 
@@ -61,19 +65,31 @@ class Vote(Base):
     __tablename__ = "votes"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    poll_id = Column(String, ForeignKey("polls.id"))
-    option_id = Column(String, ForeignKey("options.id"))
+    poll_id = Column(String, ForeignKey("polls.id"), index=True)
+    option_id = Column(String, ForeignKey("options.id"), index=True)
     device_id = Column(String, ForeignKey("devices.id"))
     source = Column(String, default="iot")
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     poll = relationship("Poll", back_populates="votes")
     option = relationship("Option", back_populates="votes")
     device = relationship("Device", back_populates="votes")
 
 
+class DeletedPoll(Base):
+    __tablename__ = "deleted_polls"
+
+    id = Column(String, primary_key=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
 class SystemLog(Base):
     __tablename__ = "system_logs"
+    __table_args__ = (
+        Index("ix_system_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_system_logs_user_email_timestamp_id", "user_email", "timestamp", "id"),
+        Index("ix_system_logs_action_timestamp_id", "action", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_email = Column(String)
@@ -0,0 +1,151 @@
+import math
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from settings import settings
+
+VELOCITY_WINDOWS = {"last_1m": 60, "last_5m": 300, "last_15m": 900}
+VELOCITY_HORIZON = max(VELOCITY_WINDOWS.values())
+
+
+def _nlogn(n: int) -> float:
+    return n * math.log2(n) if n > 0 else 0.0
+
+
+class PollAggregate:
+    __slots__ = ("options", "counts", "total", "nlogn", "loaded_at")
+
+    def __init__(self, options: Iterable[Tuple[str, str, int]]):
+        self.options: List[Tuple[str, str]] = []
+        self.counts: Dict[str, int] = {}
+        for opt_id, text, count in options:
+            self.options.append((opt_id, text))
+            self.counts[opt_id] = count or 0
+        self.total = sum(self.counts.values())
+        self.nlogn = sum(_nlogn(n) for n in self.counts.values())
+        self.loaded_at = time.monotonic()
+
+    def apply(self, option_id: str, delta: int):
+        n = self.counts.get(option_id)
+        if n is None: return
+        self.counts[option_id] = n + delta
+        self.total += delta
+        self.nlogn += _nlogn(n + delta) - _nlogn(n)
+
+    def entropy(self) -> float:
+        if self.total <= 0: return 0.0
+        return max(0.0, round(math.log2(self.total) - self.nlogn / self.total, 12))
+
+    def rows(self) -> List[Tuple[str, str, int]]:
+        return [(opt_id, text, self.counts[opt_id]) for opt_id, text in self.options]
+
+
+class PollStatsRegistry:
+    def __init__(self, resync_after: float):
+        self.resync_after = resync_after
+        self.epoch = 0
+        self._polls: Dict[str, PollAggregate] = {}
+        self._generations: Counter = Counter()
+        self._writing: Counter = Counter()
+
+    def generation(self, poll_id: str) -> Tuple[int, int]:
+        return self.epoch, self._generations[poll_id]
+
+    def begin_write(self, poll_ids: Iterable[str]):
+        for poll_id in poll_ids:
+            self._writing[poll_id] += 1
+            self._generations[poll_id] += 1
+
+    def end_write(self, poll_ids: Iterable[str]):
+        for poll_id in poll_ids:
+            self._writing[poll_id] -= 1
+            if self._writing[poll_id] <= 0: del self._writing[poll_id]
+            self._generations[poll_id] += 1
+
+    def get(self, poll_id: str) -> Optional[PollAggregate]:
+        agg = self._polls.get(poll_id)
+        if agg is not None and time.monotonic() - agg.loaded_at > self.resync_after:
+            del self._polls[poll_id]
+            return None
+        return agg
+
+    def load(self, poll_id: str, options: Iterable[Tuple[str, str, int]], generation: Tuple[int, int]) -> PollAggregate:
+        agg = PollAggregate(options)
+        if generation == self.generation(poll_id) and not self._writing[poll_id]:
+            self._polls[poll_id] = agg
+        return agg
+
+    def apply_votes(self, votes: List[dict]):
+        for (poll_id, option_id), delta in Counter((v["poll_id"], v["option_id"]) for v in votes).items():
+            agg = self._polls.get(poll_id)
+            if agg is not None: agg.apply(option_id, delta)
+
+    def drop(self, poll_id: str):
+        self._polls.pop(poll_id, None)
+        self._generations[poll_id] += 1
+
+    def clear(self):
+        self.epoch += 1
+        self._polls.clear()
+
+
+class VoteVelocity:
+    __slots__ = ("counts", "seconds", "last_second")
+
+    def __init__(self):
+        self.counts = [0] * VELOCITY_HORIZON
+        self.seconds = [-1] * VELOCITY_HORIZON
+        self.last_second = -1
+
+    def record(self, n: int, second: int):
+        slot = second % VELOCITY_HORIZON
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += n
+        self.last_second = max(self.last_second, second)
+
+    def rates(self, second: int) -> Dict[str, float]:
+        sums = dict.fromkeys(VELOCITY_WINDOWS, 0)
+        if second - self.last_second < VELOCITY_HORIZON:
+            for slot_second, count in zip(self.seconds, self.counts):
+                age = second - slot_second
+                if age < 0 or age >= VELOCITY_HORIZON: continue
+                for name, window in VELOCITY_WINDOWS.items():
+                    if age < window: sums[name] += count
+        return {name: round(sums[name] * 60 / window, 2) for name, window in VELOCITY_WINDOWS.items()}
+
+
+class VelocityRegistry:
+    def __init__(self):
+        self._polls: Dict[str, VoteVelocity] = {}
+
+    def record_votes(self, votes: List[dict]):
+        second = int(time.time())
+        for poll_id, n in Counter(v["poll_id"] for v in votes).items():
+            velocity = self._polls.get(poll_id)
+            if velocity is None:
+                velocity = self._polls[poll_id] = VoteVelocity()
+            velocity.record(n, second)
+
+    def rates(self, poll_id: str) -> Dict[str, float]:
+        velocity = self._polls.get(poll_id)
+        if velocity is None: return {name: 0.0 for name in VELOCITY_WINDOWS}
+        second = int(time.time())
+        if second - velocity.last_second >= VELOCITY_HORIZON:
+            del self._polls[poll_id]
+        return velocity.rates(second)
+
+    def tick(self, poll_id: str) -> int:
+        velocity = self._polls.get(poll_id)
+        second = int(time.time())
+        if velocity is None or second - velocity.last_second >= VELOCITY_HORIZON: return 0
+        return second // settings.velocity_etag_tick
+
+    def drop(self, poll_id: str):
+        self._polls.pop(poll_id, None)
+
+
+poll_stats = PollStatsRegistry(settings.poll_stats_resync)
+poll_velocity = VelocityRegistry()
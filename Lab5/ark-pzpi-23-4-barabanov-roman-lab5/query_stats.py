@@ -0,0 +1,99 @@
+import time
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from settings import settings
+from metrics import registry, Histogram
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 4, 5, 8, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+request_db_time = registry.register(Histogram("http_request_db_seconds", "DB time spent per request by route",
+                                              ("method", "route")))
+request_queries = registry.register(Histogram("http_request_db_queries", "DB statements executed per request by route",
+                                              ("method", "route"), QUERY_COUNT_BUCKETS))
+slow_statements = registry.register(Histogram("db_slow_statement_seconds",
+                                              "Statements slower than the slow query threshold"))
+
+
+class RequestQueries:
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold: int):
+        return [(statement, n) for statement, n in self.shapes.items() if n > threshold]
+
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    queries = current_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += elapsed
+        queries.shapes[statement] += 1
+    if elapsed * 1000 >= settings.slow_query_ms:
+        slow_statements.observe((), elapsed)
+        logger.warning("Slow statement (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started: started.pop()
+
+
+def instrument(engine: AsyncEngine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.debug:
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-db-query-count", str(queries.count).encode()),
+                    (b"x-db-time-ms", f"{queries.seconds * 1000:.2f}".encode()),
+                    (b"x-db-repeated-statements",
+                     str(len(queries.repeated(settings.repeated_query_threshold))).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_queries.reset(token)
+            path = getattr(scope.get("route"), "path", "unmatched")
+            request_db_time.observe((scope["method"], path), queries.seconds)
+            request_queries.observe((scope["method"], path), queries.count)
+            for statement, n in queries.repeated(settings.repeated_query_threshold):
+                logger.warning("Possible N+1: %s %s ran the same statement %d times: %s", scope["method"], path, n,
+                               " ".join(statement.split())[:1000])
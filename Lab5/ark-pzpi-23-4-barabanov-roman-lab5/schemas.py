@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -36,8 +36,25 @@ class DeviceRegister(BaseModel):
     room_id: Optional[str] = None
 
 class IoTClick(BaseModel):
+    device_id: str
+    button_index: int = Field(ge=0)
+    clicked_at: Optional[datetime] = None
+
+class IoTClickBatch(BaseModel):
+    clicks: List[IoTClick]
+
+class IoTClickResult(BaseModel):
     device_id: str
     button_index: int
+    status: str
+    poll: Optional[str] = None
+    choice: Optional[str] = None
+    message: str
+
+class IoTClickBatchResult(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[IoTClickResult]
 
 class DeviceRead(BaseModel):
     id: str
@@ -73,9 +90,17 @@ class PollRead(BaseModel):
     class Config:
         from_attributes = True
 
+class VoteVelocity(BaseModel):
+    last_1m: float
+    last_5m: float
+    last_15m: float
+
 class PollAnalytics(BaseModel):
     total_votes: int
     controversy_index: float
+    vote_velocity_bpm: float
+    vote_velocity: VoteVelocity
+    activity_status: str
     consensus_status: str
 
 class OptionReadWithStats(BaseModel):
@@ -0,0 +1,95 @@
+import math
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from main import calculate_stats, build_stats, bulk_stats
+from poll_stats import PollAggregate, VELOCITY_WINDOWS
+
+VELOCITY = dict.fromkeys(VELOCITY_WINDOWS, 0.0)
+
+
+def reference_stats(counts):
+    total = sum(counts)
+    entropy = 0.0
+
+    if total > 0:
+        for n in counts:
+            p = n / total
+            if p > 0: entropy -= p * math.log2(p)
+
+    stats_opts = []
+    for n in counts:
+        p = 0.0 if total == 0 else n / total
+        err = 1.96 * math.sqrt((p * (1 - p)) / total) if total > 1 else 0.0
+        stats_opts.append((n, round(p * 100, 1), round(err * 100, 1)))
+
+    return total, round(entropy, 2), "High Controversy" if entropy > 1.0 else "Consensus", stats_opts
+
+
+def summary(stats):
+    analytics = stats["analytics"]
+    return (analytics["total_votes"], analytics["controversy_index"], analytics["consensus_status"],
+            [(o["vote_count"], o["percentage"], o["margin_of_error"]) for o in stats["options"]])
+
+
+def rows(counts):
+    return [(f"opt-{i}", f"Option {i}", n) for i, n in enumerate(counts)]
+
+
+def aggregate(counts):
+    agg = PollAggregate((opt_id, text, 0) for opt_id, text, _ in rows(counts))
+    for opt_id, _, n in rows(counts):
+        for _ in range(n): agg.apply(opt_id, 1)
+    return agg
+
+
+GOLDEN = [
+    ([], (0, 0.0, "Consensus", [])),
+    ([0, 0], (0, 0.0, "Consensus", [(0, 0.0, 0.0), (0, 0.0, 0.0)])),
+    ([5], (5, 0.0, "Consensus", [(5, 100.0, 0.0)])),
+    ([1, 1], (2, 1.0, "Consensus", [(1, 50.0, 69.3), (1, 50.0, 69.3)])),
+    ([3, 1, 0], (4, 0.81, "Consensus", [(3, 75.0, 42.4), (1, 25.0, 42.4), (0, 0.0, 0.0)])),
+    ([1, 1, 1], (3, 1.58, "High Controversy", [(1, 33.3, 53.3), (1, 33.3, 53.3), (1, 33.3, 53.3)])),
+]
+
+
+@pytest.mark.parametrize("counts, expected", GOLDEN)
+def test_reference_matches_golden(counts, expected):
+    assert reference_stats(counts) == expected
+
+
+@pytest.mark.parametrize("counts, expected", GOLDEN)
+def test_stats_match_golden(counts, expected):
+    agg = aggregate(counts)
+    assert summary(build_stats(agg.total, agg.entropy(), agg.rows(), VELOCITY)) == expected
+    options = [SimpleNamespace(id=opt_id, text=text, vote_count=n) for opt_id, text, n in rows(counts)]
+    assert summary(calculate_stats(options, VELOCITY)) == expected
+    assert summary(bulk_stats(["p"], [("p", *r) for r in rows(counts)], {"p": VELOCITY})["p"]) == expected
+
+
+def random_polls(n, seed=42):
+    rng = random.Random(seed)
+    polls = []
+    for _ in range(n):
+        weights = [rng.random() ** 3 for _ in range(rng.randint(1, 12))]
+        counts = [0] * len(weights)
+        for _ in range(rng.randint(0, 500)):
+            counts[rng.choices(range(len(weights)), weights)[0]] += 1
+        polls.append(counts)
+    return polls
+
+
+def test_incremental_aggregate_matches_reference():
+    for counts in random_polls(500):
+        agg = aggregate(counts)
+        assert summary(build_stats(agg.total, agg.entropy(), agg.rows(), VELOCITY)) == reference_stats(counts)
+
+
+def test_bulk_stats_matches_reference():
+    polls = {f"poll-{i}": counts for i, counts in enumerate(random_polls(500, seed=7))}
+    option_rows = [(poll_id, *r) for poll_id, counts in polls.items() for r in rows(counts)]
+    bulk = bulk_stats(list(polls), option_rows, dict.fromkeys(polls, VELOCITY))
+    for poll_id, counts in polls.items():
+        assert summary(bulk[poll_id]) == reference_stats(counts)
@@ -0,0 +1,108 @@
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import AsyncSessionLocal
+from voting import commit_votes
+from metrics import votes_dead_lettered
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    def __init__(self, max_size: int, max_staleness: float, max_pending: int):
+        self.max_size = max_size
+        self.max_staleness = max_staleness
+        self.max_pending = max_pending
+        self.dead_lettered = 0
+        self._pending: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, votes: List[dict]) -> bool:
+        if len(self._pending) + len(votes) > self.max_pending:
+            self._wakeup.set()
+            return False
+        now = datetime.utcnow()
+        for v in votes:
+            v.setdefault("id", str(uuid.uuid4()))
+            v.setdefault("created_at", now)
+        self._pending.extend(votes)
+        if len(self._pending) >= self.max_size:
+            self._wakeup.set()
+        return True
+
+    @staticmethod
+    async def _store(batch: List[dict]):
+        async with AsyncSessionLocal() as db:
+            await commit_votes(db, batch)
+
+    def _dead_letter(self, vote: dict):
+        self.dead_lettered += 1
+        votes_dead_lettered.inc()
+        logger.error("Dropping vote rejected by the database: %s", vote)
+
+    async def flush(self) -> int:
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch: return 0
+            stored, chunks = 0, [batch]
+            try:
+                while chunks:
+                    try:
+                        await self._store(chunks[-1])
+                        stored += len(chunks.pop())
+                    except IntegrityError:
+                        chunk = chunks.pop()
+                        if len(chunk) == 1:
+                            self._dead_letter(chunk[0])
+                        else:
+                            mid = len(chunk) // 2
+                            chunks += [chunk[mid:], chunk[:mid]]
+            except BaseException:
+                self._pending[:0] = [v for chunk in reversed(chunks) for v in chunk]
+                raise
+            return stored
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.max_staleness)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Vote buffer flush failed, %d votes kept for retry", len(self._pending))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Vote buffer final flush failed, %d votes lost", len(self._pending))
+
+
+vote_buffer = VoteBuffer(settings.vote_buffer_max_size, settings.vote_buffer_max_staleness,
+                         settings.vote_buffer_max_pending)
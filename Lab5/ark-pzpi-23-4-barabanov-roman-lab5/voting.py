@@ -0,0 +1,112 @@
+from collections import Counter
+from typing import Dict, List, Iterable, Optional
+
+from sqlalchemy import select, insert, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Device, Poll, Option, Vote
+from cache import ActivePoll, active_poll_cache, device_cache, poll_versions
+from poll_stats import poll_stats, poll_velocity
+from broker import poll_broker
+
+
+async def load_device_rooms(db: AsyncSession, device_ids: Iterable[str]) -> Dict[str, str]:
+    ids = set(device_ids)
+    if not ids: return {}
+    res = await db.execute(select(Device.id, Device.room_id).where(Device.id.in_(ids)))
+    return {dev_id: room_id for dev_id, room_id in res.all()}
+
+
+async def resolve_device_rooms(db: AsyncSession, device_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    resolved, missing = {}, set()
+    for device_id in set(device_ids):
+        hit, room_id = device_cache.get(device_id)
+        if hit:
+            resolved[device_id] = room_id
+        else:
+            missing.add(device_id)
+    if not missing: return resolved
+
+    generation = device_cache.generation
+    loaded = await load_device_rooms(db, missing)
+    for device_id in missing:
+        resolved[device_id] = loaded.get(device_id)
+        device_cache.put(device_id, resolved[device_id], generation)
+    return resolved
+
+
+async def load_active_polls(db: AsyncSession, room_ids: Iterable[str]) -> Dict[str, ActivePoll]:
+    rooms = set(room_ids)
+    if not rooms: return {}
+    res = await db.execute(
+        select(Poll.id, Poll.title, Poll.room_id, Poll.created_at)
+        .where(Poll.room_id.in_(rooms), Poll.is_active == True)
+        .order_by(Poll.created_at.desc()))
+
+    latest = {}
+    for poll_id, title, room_id, created_at in res.all():
+        latest.setdefault(room_id, (poll_id, title, created_at))
+    if not latest: return {}
+
+    options = {poll_id: [] for poll_id, _, _ in latest.values()}
+    opts = await db.execute(
+        select(Option.id, Option.text, Option.poll_id)
+        .where(Option.poll_id.in_(options))
+        .order_by(Option.position, Option.id))
+    for opt_id, text, poll_id in opts.all():
+        options[poll_id].append((opt_id, text))
+
+    return {
+        room_id: ActivePoll(poll_id, title, tuple(o[0] for o in options[poll_id]),
+                            tuple(o[1] for o in options[poll_id]), created_at)
+        for room_id, (poll_id, title, created_at) in latest.items()
+    }
+
+
+async def resolve_active_polls(db: AsyncSession, room_ids: Iterable[str]) -> Dict[str, Optional[ActivePoll]]:
+    resolved, missing = {}, set()
+    for room_id in set(room_ids):
+        hit, poll = active_poll_cache.get(room_id)
+        if hit:
+            resolved[room_id] = poll
+        else:
+            missing.add(room_id)
+    if not missing: return resolved
+
+    generation = active_poll_cache.generation
+    loaded = await load_active_polls(db, missing)
+    for room_id in missing:
+        resolved[room_id] = loaded.get(room_id)
+        active_poll_cache.put(room_id, resolved[room_id], generation)
+    return resolved
+
+
+async def store_votes(db: AsyncSession, votes: List[dict]):
+    if not votes: return
+    await db.execute(insert(Vote), votes)
+
+    deltas = Counter(v["option_id"] for v in votes)
+    await db.execute(
+        update(Option)
+        .where(Option.id.in_(deltas))
+        .values(vote_count=Option.vote_count + case(deltas, value=Option.id, else_=0))
+        .execution_options(synchronize_session=False))
+
+
+async def commit_votes(db: AsyncSession, votes: List[dict]):
+    poll_ids = {v["poll_id"] for v in votes}
+    poll_stats.begin_write(poll_ids)
+    try:
+        await store_votes(db, votes)
+        await db.commit()
+    finally:
+        poll_stats.end_write(poll_ids)
+    votes_committed(votes)
+
+
+def votes_committed(votes: List[dict]):
+    poll_stats.apply_votes(votes)
+    poll_velocity.record_votes(votes)
+    for poll_id in {v["poll_id"] for v in votes}:
+        poll_versions.bump(poll_id)
+        poll_broker.publish(poll_id)